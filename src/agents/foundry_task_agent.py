@@ -1,10 +1,14 @@
+import asyncio
+import logging
 import os
 from typing import Optional
-from azure.identity import DefaultAzureCredential
+from azure.core.credentials import TokenCredential
+from azure.core.pipeline.transport import HttpTransport
 from azure.ai.projects import AIProjectClient
 from ..services import TaskService
 from ..models import ChatMessage, Role
 
+logger = logging.getLogger(__name__)
 
 class FoundryTaskAgent:
     """
@@ -21,38 +25,56 @@ class FoundryTaskAgent:
     - AZURE_AI_FOUNDRY_AGENT_ID: The identifier of the agent to use
     """
     
-    def __init__(self, task_service: TaskService):
+    def __init__(
+        self,
+        task_service: TaskService,
+        credential: TokenCredential,
+        transport: Optional[HttpTransport] = None
+    ):
         self.task_service = task_service
         self.project_client = None
         self.agent_id = None
+        # The conversation thread is created on the first message, so worker
+        # processes that never receive Foundry traffic never provision one
         self.thread_id = None
+        # Foundry rejects a new message or run while the thread has an active run,
+        # so messages on the shared thread are handled one at a time. The lock also
+        # ensures the thread is only created once.
+        self._run_lock = asyncio.Lock()
         
         # Initialize the agent
         endpoint = os.getenv("AZURE_AI_FOUNDRY_PROJECT_ENDPOINT")
         agent_id = os.getenv("AZURE_AI_FOUNDRY_AGENT_ID")
         
         if not endpoint or not agent_id:
-            print("Azure AI Foundry configuration missing. Set AZURE_AI_FOUNDRY_PROJECT_ENDPOINT and AZURE_AI_FOUNDRY_AGENT_ID")
+            logger.warning("Azure AI Foundry configuration missing. Set AZURE_AI_FOUNDRY_PROJECT_ENDPOINT and AZURE_AI_FOUNDRY_AGENT_ID")
             return
         
         try:
-            # Create the project client using Azure credentials
+            # Create the project client using the shared Azure credential. The transport,
+            # when given, is also used by the agents client created from it.
+            client_kwargs = {"transport": transport} if transport else {}
             self.project_client = AIProjectClient(
                 endpoint=endpoint,
-                credential=DefaultAzureCredential()
+                credential=credential,
+                **client_kwargs
             )
             self.agent_id = agent_id
-            
-            # Create a thread for this session
-            thread = self.project_client.agents.threads.create()
-            self.thread_id = thread.id
-            print(f"Created thread: {self.thread_id}")
-            print("Azure AI Foundry Task Agent initialized successfully")
+            logger.info("Azure AI Foundry Task Agent initialized successfully")
             
         except ImportError as e:
-            print(f"Azure AI Projects SDK not available. Install azure-ai-projects package: {e}")
-        except Exception as e:
-            print(f"Failed to initialize Azure AI Foundry agent: {e}")
+            logger.error("Azure AI Projects SDK not available. Install azure-ai-projects package: %s", e)
+        except Exception:
+            logger.exception("Failed to initialize Azure AI Foundry agent")
+    
+    async def _get_thread_id(self) -> str:
+        """Return the conversation thread, creating it on first use. The caller must hold _run_lock."""
+        if not self.thread_id:
+            # The SDK client is synchronous, so the network call runs in a worker thread
+            thread = await asyncio.to_thread(self.project_client.agents.threads.create)
+            self.thread_id = thread.id
+            logger.info("Created thread: %s", self.thread_id)
+        return self.thread_id
     
     async def process_message(self, message: str) -> ChatMessage:
         """
@@ -64,75 +86,84 @@ class FoundryTaskAgent:
         Returns:
             ChatMessage object containing the assistant's response
         """
-        if not self.project_client or not self.agent_id or not self.thread_id:
+        if not self.project_client or not self.agent_id:
             return ChatMessage(
                 role=Role.ASSISTANT,
                 content="Azure AI Foundry agent is not properly configured. Please check your settings."
             )
         
         try:
-            # Create the message in the thread
-            message_obj = self.project_client.agents.messages.create(
-                thread_id=self.thread_id,
-                role="user",
-                content=message
-            )
-            print(f"Created message, ID: {message_obj.id}")
+            async with self._run_lock:
+                thread_id = await self._get_thread_id()
             
-            # Create and process the run
-            run = self.project_client.agents.runs.create_and_process(
-                thread_id=self.thread_id,
-                agent_id=self.agent_id
-            )
-            print(f"Run finished with status: {run.status}")
+                # Create the message in the thread
+                message_obj = await asyncio.to_thread(
+                    self.project_client.agents.messages.create,
+                    thread_id=thread_id,
+                    role="user",
+                    content=message
+                )
+                logger.debug("Created message, ID: %s", message_obj.id)
             
-            if run.status == "failed":
-                print(f"Run failed: {run.last_error}")
-                return ChatMessage(
-                    role=Role.ASSISTANT,
-                    content="I encountered an error processing your request. Please try again."
+                # Create and process the run; this polls until the run finishes
+                run = await asyncio.to_thread(
+                    self.project_client.agents.runs.create_and_process,
+                    thread_id=thread_id,
+                    agent_id=self.agent_id
                 )
+                logger.debug("Run finished with status: %s", run.status)
             
-            if run.status == "completed":
-                # Fetch the latest messages from the thread
-                messages = self.project_client.agents.messages.list(thread_id=self.thread_id)
-                
-                # Find the latest assistant message
-                for msg in messages:
-                    if msg.role == "assistant":
-                        # Extract text content from the message
-                        content = ""
-                        if hasattr(msg, 'content') and msg.content:
-                            for content_item in msg.content:
-                                if hasattr(content_item, 'text') and hasattr(content_item.text, 'value'):
-                                    content += content_item.text.value
-                                elif hasattr(content_item, 'value'):
-                                    content += str(content_item.value)
-                        
+                if run.status == "failed":
+                    logger.error("Run failed: %s", run.last_error)
+                    return ChatMessage(
+                        role=Role.ASSISTANT,
+                        content="I encountered an error processing your request. Please try again."
+                    )
+            
+                if run.status == "completed":
+                    content = await asyncio.to_thread(self._get_reply_text, run.id)
+                    if content is not None:
                         return ChatMessage(
                             role=Role.ASSISTANT,
                             content=content if content else "I received your message but couldn't generate a response."
                         )
                 
-                return ChatMessage(
-                    role=Role.ASSISTANT,
-                    content="I processed your request but couldn't find a response."
-                )
-            else:
-                return ChatMessage(
-                    role=Role.ASSISTANT,
-                    content=f"I encountered an issue processing your request. Status: {run.status}"
-                )
+                    return ChatMessage(
+                        role=Role.ASSISTANT,
+                        content="I processed your request but couldn't find a response."
+                    )
+                else:
+                    return ChatMessage(
+                        role=Role.ASSISTANT,
+                        content=f"I encountered an issue processing your request. Status: {run.status}"
+                    )
                 
-        except Exception as e:
-            print(f"Error processing message with Azure AI Foundry: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error processing message with Azure AI Foundry")
             return ChatMessage(
                 role=Role.ASSISTANT,
                 content="I apologize, but I encountered an error processing your request."
             )
     
+    def _get_reply_text(self, run_id: str) -> Optional[str]:
+        """Return the text of the latest assistant message from a run, or None if there is none."""
+        # Fetch only this run's messages, newest first, one small page at a time
+        messages = self.project_client.agents.messages.list(
+            thread_id=self.thread_id,
+            run_id=run_id,
+            order="desc",
+            limit=5
+        )
+        
+        # Find the latest assistant message
+        for msg in messages:
+            if msg.role == "assistant":
+                # Extract text content from the message
+                return "".join(
+                    item.text.value for item in msg.content or [] if getattr(item, "text", None)
+                )
+        return None
+    
     async def cleanup(self):
         """Cleanup method for session management (no-op for Azure AI Foundry)."""
         # Azure AI Foundry handles cleanup automatically
@@ -1,21 +1,104 @@
+import logging
 import os
+import re
 import uuid
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from functools import partial
+from typing import Optional, Any, List, Tuple
+import httpx
 from langchain_openai import AzureChatOpenAI
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
-from langgraph.prebuilt import create_react_agent
+from azure.core.credentials import TokenCredential
+from azure.identity import get_bearer_token_provider
+from langgraph.prebuilt import ToolNode, create_react_agent
 from langgraph.checkpoint.memory import InMemorySaver
-from langchain_core.tools import tool
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 from ..services import TaskService
 from ..models import ChatMessage, Role
 
+logger = logging.getLogger(__name__)
+
+# Conversations kept in memory; the least recently used session is dropped beyond this
+MAX_SESSIONS = 10_000
+
+# Replies to the opening message of a conversation are reused when the same message
+# opens another one, until task data changes in this or any other worker process
+MAX_CACHED_RESPONSES = 1000
+
+# Only these plain requests to read the task list are ever answered from the cache
+READ_ONLY_MESSAGE = re.compile(
+    r"(please )?("
+    r"(list|show|display|view|get)( me)?( all)?( of)?( my| the)?( current)? tasks( list)?"
+    r"|what are my tasks"
+    r"|what tasks do i have"
+    r"|what'?s on my (task|to-?do) list"
+    r")( please)?"
+)
+
+
+# Kept identical across sessions and free of per-user data so the model's prompt
+# cache can reuse it. Anything that depends on current task data must come from
+# tool calls later in the conversation, never from this prompt.
+SYSTEM_PROMPT = """You are Task Manager Assistant, a helpful assistant built into a task management web app. \
+You help the user keep track of their to-do list by creating, finding, updating and deleting tasks.
+
+## What a task is
+Each task has exactly three fields:
+- id: a positive integer assigned by the app when the task is created. Users often refer to tasks by this number.
+- title: a short free-text description of the task.
+- isComplete: true when the task is done, false otherwise. New tasks are incomplete unless the user says otherwise.
+
+## Tools
+You can only see and change tasks through the tools below. You have no other memory of the task list, \
+so never guess what tasks exist, what their IDs are, or what state they are in.
+- getTasks: list every task. Use it when the user asks what is on their list, or when you need to find a task \
+by its title rather than its ID.
+- getTask: read one task by ID.
+- getTasksByIds: read several tasks by ID in one call. Prefer it over calling getTask repeatedly.
+- createTask: add a new task with a title and, optionally, a completion status.
+- createTasks: add several tasks in one call. Prefer it over calling createTask repeatedly.
+- updateTask: change the title and/or completion status of one task by ID. Leave out any field that should stay the same.
+- updateTasks: apply several updates in one call. Prefer it over calling updateTask repeatedly, for example \
+when the user asks to mark several tasks complete.
+- deleteTask: permanently remove one task by ID.
+
+## How to work
+1. Work out what the user wants. Requests can be phrased in many ways: "tick off", "finish", "I did" and \
+"mark as done" all mean setting isComplete to true; "reopen" or "undo" means setting it to false.
+2. If the user names a task by its title instead of its ID, call getTasks first and match the title. If more \
+than one task could match, list the candidates with their IDs and ask which one they mean instead of guessing.
+3. When several independent actions are needed, request them together in one step, or use the bulk tools, \
+rather than one at a time.
+4. Only report a change as done after the tool result confirms it. If a tool says a task was not found, tell \
+the user plainly and, where useful, offer to show the current list.
+5. Deleting a task cannot be undone. If a delete request is ambiguous (for example "delete the old ones"), \
+confirm exactly which tasks you are about to delete before doing it. A clear request such as \
+"delete task 4" does not need confirmation.
+6. Do not invent tasks, IDs or statuses, and do not create, change or delete anything the user did not ask for.
+
+## How to reply
+- Be brief and friendly. One or two sentences is usually enough after an action.
+- When listing tasks, use one line per task in the form "#<id> <title> - Complete" or "#<id> <title> - Incomplete", \
+in ID order, and say how many tasks there are. If the list is empty, say so and offer to add a task.
+- After creating a task, mention its new ID so the user can refer to it later.
+- After updating or deleting tasks, name the tasks that changed.
+- Use plain text. Avoid headings, tables and code blocks; simple "-" bullet lines are fine.
+- If the user asks for something unrelated to managing their tasks, answer briefly if you can, and remind them \
+that you are here to help with their task list.
+- Reply in the same language the user writes in.
+"""
+
 
 class CreateTaskInput(BaseModel):
     title: str = Field(description="The title of the task")
     isComplete: bool = Field(default=False, description="Whether the task is complete")
 
 
+class CreateTasksInput(BaseModel):
+    items: List[CreateTaskInput] = Field(description="The tasks to create")
+
+
 class GetTaskInput(BaseModel):
     id: int = Field(description="The ID of the task to retrieve")
 
@@ -26,10 +109,90 @@ class UpdateTaskInput(BaseModel):
     isComplete: Optional[bool] = Field(default=None, description="The new completion status")
 
 
+class GetTasksByIdsInput(BaseModel):
+    ids: List[int] = Field(description="The IDs of the tasks to retrieve")
+
+
+class UpdateTasksInput(BaseModel):
+    items: List[UpdateTaskInput] = Field(description="The updates to apply, one per task")
+
+
 class DeleteTaskInput(BaseModel):
     id: int = Field(description="The ID of the task to delete")
 
 
+class GetTasksInput(BaseModel):
+    pass
+
+
+async def _create_task(task_service: TaskService, title: str, isComplete: bool = False) -> str:
+    task = await task_service.add_task(title, isComplete)
+    return f'Task created successfully: "{task.title}" (ID: {task.id})'
+
+
+async def _create_tasks(task_service: TaskService, items: List[CreateTaskInput]) -> str:
+    tasks = await task_service.add_tasks([(item.title, item.isComplete) for item in items])
+    if not tasks:
+        return 'No tasks given.'
+    
+    task_list = '\n'.join([f'- "{t.title}" (ID: {t.id})' for t in tasks])
+    return f'Created {len(tasks)} tasks:\n{task_list}'
+
+
+async def _get_tasks(task_service: TaskService) -> str:
+    tasks = await task_service.get_all_tasks()
+    if not tasks:
+        return 'No tasks found.'
+    
+    task_list = '\n'.join([
+        f'- {t.id}: {t.title} ({"Complete" if t.isComplete else "Incomplete"})'
+        for t in tasks
+    ])
+    return f'Found {len(tasks)} tasks:\n{task_list}'
+
+
+async def _get_task(task_service: TaskService, id: int) -> str:
+    task = await task_service.get_task_by_id(id)
+    if not task:
+        return f'Task with ID {id} not found.'
+    
+    status = "Complete" if task.isComplete else "Incomplete"
+    return f'Task {task.id}: "{task.title}" - Status: {status}'
+
+
+async def _get_tasks_by_ids(task_service: TaskService, ids: List[int]) -> str:
+    tasks = await task_service.get_tasks_by_ids(ids)
+    found_ids = {t.id for t in tasks}
+    lines = [
+        f'Task {t.id}: "{t.title}" - Status: {"Complete" if t.isComplete else "Incomplete"}'
+        for t in tasks
+    ]
+    lines.extend(f'Task with ID {id} not found.' for id in ids if id not in found_ids)
+    return '\n'.join(lines) if lines else 'No task IDs given.'
+
+
+async def _update_task(task_service: TaskService, id: int, title: Optional[str] = None, isComplete: Optional[bool] = None) -> str:
+    updated = await task_service.update_task(id, title, isComplete)
+    if not updated:
+        return f'Task with ID {id} not found.'
+    return f'Task {id} updated successfully.'
+
+
+async def _update_tasks(task_service: TaskService, items: List[UpdateTaskInput]) -> str:
+    tasks = await task_service.update_tasks([(item.id, item.title, item.isComplete) for item in items])
+    updated_ids = {t.id for t in tasks}
+    lines = [f'Task {t.id} updated successfully.' for t in tasks]
+    lines.extend(f'Task with ID {item.id} not found.' for item in items if item.id not in updated_ids)
+    return '\n'.join(lines) if lines else 'No updates given.'
+
+
+async def _delete_task(task_service: TaskService, id: int) -> str:
+    deleted = await task_service.delete_task(id)
+    if not deleted:
+        return f'Task with ID {id} not found.'
+    return f'Task {id} deleted successfully.'
+
+
 class LangGraphTaskAgent:
     """
     LangGraph-based agent for task management chat.
@@ -40,23 +203,28 @@ class LangGraphTaskAgent:
     - Memory management for conversation state
     """
     
-    def __init__(self, task_service: TaskService):
+    def __init__(
+        self,
+        task_service: TaskService,
+        credential: TokenCredential,
+        http_async_client: Optional[httpx.AsyncClient] = None
+    ):
         self.task_service = task_service
         self.llm = None
         self.agent = None
         self.memory = InMemorySaver()
-        self.session_ids: Dict[str, str] = {}
+        self.session_ids: "OrderedDict[str, str]" = OrderedDict()
+        self._response_cache: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
         
         try:
             endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
             deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
             
             if not endpoint or not deployment_name:
-                print("Azure OpenAI configuration missing for LangGraph agent")
+                logger.warning("Azure OpenAI configuration missing for LangGraph agent")
                 return
             
-            # Initialize Azure OpenAI client
-            credential = DefaultAzureCredential()
+            # Initialize Azure OpenAI client with the shared Azure credential
             azure_ad_token_provider = get_bearer_token_provider(
                 credential, "https://cognitiveservices.azure.com/.default"
             )
@@ -65,84 +233,113 @@ class LangGraphTaskAgent:
                 azure_endpoint=endpoint,
                 azure_deployment=deployment_name,
                 azure_ad_token_provider=azure_ad_token_provider,
-                api_version="2024-10-21"
+                api_version="2024-10-21",
+                http_async_client=http_async_client
             )
             
-            # Define tools
-            tools = [
-                self._create_task_tool(),
-                self._get_tasks_tool(),
-                self._get_task_tool(),
-                self._update_task_tool(),
-                self._delete_task_tool()
-            ]
+            # Define tools. ToolNode runs all tool calls from one model turn concurrently;
+            # errors are returned to the model as tool messages so one failing call does
+            # not discard the results of the others.
+            self.tools = self._build_tools()
+            tool_node = ToolNode(self.tools, handle_tool_errors=True)
             
             # Create the agent
-            self.agent = create_react_agent(self.llm, tools, checkpointer=self.memory)
-            print("LangGraph Task Agent initialized successfully")
+            self.agent = create_react_agent(
+                self.llm,
+                tool_node,
+                prompt=SYSTEM_PROMPT,
+                checkpointer=self.memory
+            )
+            logger.info("LangGraph Task Agent initialized successfully")
             
-        except Exception as e:
-            print(f"Failed to initialize LangGraph agent: {e}")
-    
-    def _create_task_tool(self):
-        @tool("createTask", args_schema=CreateTaskInput)
-        async def create_task(title: str, isComplete: bool = False) -> str:
-            """Create a new task"""
-            task = await self.task_service.add_task(title, isComplete)
-            return f'Task created successfully: "{task.title}" (ID: {task.id})'
-        
-        return create_task
+        except Exception:
+            logger.exception("Failed to initialize LangGraph agent")
     
-    def _get_tasks_tool(self):
-        @tool("getTasks")
-        async def get_tasks() -> str:
-            """Get all tasks"""
-            tasks = await self.task_service.get_all_tasks()
-            if not tasks:
-                return 'No tasks found.'
-            
-            task_list = '\n'.join([
-                f'- {t.id}: {t.title} ({"Complete" if t.isComplete else "Incomplete"})'
-                for t in tasks
-            ])
-            return f'Found {len(tasks)} tasks:\n{task_list}'
-        
-        return get_tasks
+    def _build_tools(self) -> List[StructuredTool]:
+        """Bind the task tool functions to this agent's task service."""
+        return [
+            StructuredTool.from_function(
+                coroutine=partial(_create_task, self.task_service),
+                name="createTask",
+                description="Create a new task",
+                args_schema=CreateTaskInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_create_tasks, self.task_service),
+                name="createTasks",
+                description="Create several tasks in one call. Prefer this over repeated createTask calls when adding more than one task",
+                args_schema=CreateTasksInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_get_tasks, self.task_service),
+                name="getTasks",
+                description="Get all tasks",
+                args_schema=GetTasksInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_get_task, self.task_service),
+                name="getTask",
+                description="Get a specific task by ID",
+                args_schema=GetTaskInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_get_tasks_by_ids, self.task_service),
+                name="getTasksByIds",
+                description="Get several tasks by ID in one call. Prefer this over repeated getTask calls when more than one task is needed",
+                args_schema=GetTasksByIdsInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_update_task, self.task_service),
+                name="updateTask",
+                description="Update a task by ID",
+                args_schema=UpdateTaskInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_update_tasks, self.task_service),
+                name="updateTasks",
+                description="Update several tasks in one call. Prefer this over repeated updateTask calls when changing more than one task",
+                args_schema=UpdateTasksInput
+            ),
+            StructuredTool.from_function(
+                coroutine=partial(_delete_task, self.task_service),
+                name="deleteTask",
+                description="Delete a task by ID",
+                args_schema=DeleteTaskInput
+            )
+        ]
     
-    def _get_task_tool(self):
-        @tool("getTask", args_schema=GetTaskInput)
-        async def get_task(id: int) -> str:
-            """Get a specific task by ID"""
-            task = await self.task_service.get_task_by_id(id)
-            if not task:
-                return f'Task with ID {id} not found.'
-            
-            status = "Complete" if task.isComplete else "Incomplete"
-            return f'Task {task.id}: "{task.title}" - Status: {status}'
+    def _get_thread_id(self, session_id: str) -> str:
+        """Return the thread for a session, evicting the least recently used session when full."""
+        thread_id = self.session_ids.get(session_id)
+        if thread_id:
+            self.session_ids.move_to_end(session_id)
+            return thread_id
         
-        return get_task
+        thread_id = str(uuid.uuid4())
+        self.session_ids[session_id] = thread_id
+        if len(self.session_ids) > MAX_SESSIONS:
+            _, old_thread_id = self.session_ids.popitem(last=False)
+            self.memory.delete_thread(old_thread_id)
+        return thread_id
     
-    def _update_task_tool(self):
-        @tool("updateTask", args_schema=UpdateTaskInput)
-        async def update_task(id: int, title: Optional[str] = None, isComplete: Optional[bool] = None) -> str:
-            """Update a task by ID"""
-            updated = await self.task_service.update_task(id, title, isComplete)
-            if not updated:
-                return f'Task with ID {id} not found.'
-            return f'Task {id} updated successfully.'
+    def _get_cached_response(self, key: str, version: int) -> Optional[str]:
+        """Return a cached reply if task data has not changed since it was stored."""
+        cached = self._response_cache.get(key)
+        if not cached:
+            return None
         
-        return update_task
+        cached_version, content = cached
+        if cached_version != version:
+            del self._response_cache[key]
+            return None
+        return content
     
-    def _delete_task_tool(self):
-        @tool("deleteTask", args_schema=DeleteTaskInput)
-        async def delete_task(id: int) -> str:
-            """Delete a task by ID"""
-            deleted = await self.task_service.delete_task(id)
-            if not deleted:
-                return f'Task with ID {id} not found.'
-            return f'Task {id} deleted successfully.'
-        
-        return delete_task
+    def _cache_response(self, key: str, version: int, content: str):
+        """Store a reply, evicting the oldest entries beyond MAX_CACHED_RESPONSES."""
+        self._response_cache[key] = (version, content)
+        self._response_cache.move_to_end(key)
+        while len(self._response_cache) > MAX_CACHED_RESPONSES:
+            self._response_cache.popitem(last=False)
     
     async def process_message(self, message: str, session_id: Optional[str] = None) -> ChatMessage:
         """
@@ -161,19 +358,36 @@ class LangGraphTaskAgent:
                 content="LangGraph agent is not properly configured. Please check your Azure OpenAI settings."
             )
         
+        # Use provided session_id or generate a new one
+        if session_id:
+            thread_id = self._get_thread_id(session_id)
+        else:
+            thread_id = str(uuid.uuid4())
+        
         try:
-            # Use provided session_id or generate a new one
-            if session_id:
-                thread_id = self.session_ids.get(session_id)
-                if not thread_id:
-                    thread_id = str(uuid.uuid4())
-                    self.session_ids[session_id] = thread_id
-            else:
-                thread_id = str(uuid.uuid4())
-            
             # Create config for the agent
             config = {"configurable": {"thread_id": thread_id}}
             
+            # A reply can only be reused when it does not depend on earlier turns, so the
+            # cache is limited to known read-only messages that open a new conversation
+            cache_key = None
+            version = None
+            normalized = " ".join(message.lower().split()).rstrip("?.!")
+            if READ_ONLY_MESSAGE.fullmatch(normalized) and await self.memory.aget_tuple(config) is None:
+                cache_key = normalized
+                # get_version also picks up commits made by other worker processes
+                version = await self.task_service.get_version()
+                cached_content = self._get_cached_response(cache_key, version)
+                if cached_content is not None:
+                    if session_id:
+                        # Record the turn so later messages in the session see it in history
+                        await self.agent.aupdate_state(
+                            config,
+                            {"messages": [HumanMessage(content=message), AIMessage(content=cached_content)]},
+                            as_node="agent"
+                        )
+                    return ChatMessage(role=Role.ASSISTANT, content=cached_content)
+            
             # Process the message
             result = await self.agent.ainvoke(
                 {"messages": [("user", message)]},
@@ -188,6 +402,9 @@ class LangGraphTaskAgent:
             
             if assistant_messages:
                 response_content = assistant_messages[-1].content
+                # Skip caching if a tool changed tasks while handling this message
+                if cache_key and version == await self.task_service.get_version():
+                    self._cache_response(cache_key, version, response_content)
             else:
                 response_content = "I apologize, but I couldn't process your request."
             
@@ -196,9 +413,13 @@ class LangGraphTaskAgent:
                 content=response_content
             )
             
-        except Exception as e:
-            print(f"Error processing message with LangGraph agent: {e}")
+        except Exception:
+            logger.exception("Error processing message with LangGraph agent")
             return ChatMessage(
                 role=Role.ASSISTANT,
                 content="I apologize, but I encountered an error processing your request."
             )
+        finally:
+            # A message without a session can never be continued, so don't keep its state
+            if not session_id:
+                self.memory.delete_thread(thread_id)
@@ -1,9 +1,15 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 import os
+import httpx
+import requests
 from dotenv import load_dotenv
+from azure.core.pipeline.transport import RequestsTransport
+from azure.identity import DefaultAzureCredential
 from .services import TaskService
 from .agents import LangGraphTaskAgent, FoundryTaskAgent
 from .routes import create_api_routes
@@ -11,6 +17,12 @@ from .routes import create_api_routes
 # Load environment variables from .env file
 load_dotenv()
 
+# LOG_LEVEL applies to this application's loggers only. The root logger stays at
+# WARNING so azure-core and httpx do not log every HTTP request at INFO.
+logging.basicConfig()
+logging.getLogger(__package__).setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
 
 class TaskManagerApp:
     """FastAPI application for task management with AI agents."""
@@ -30,17 +42,42 @@ class TaskManagerApp:
             description="A simple task management API for Azure AI Foundry Agents",
             servers=[
                 {"url": server_url, "description": "Task Manager API Server"}
-            ]
+            ],
+            default_response_class=ORJSONResponse,
+            lifespan=self._lifespan
         )
         
-        # Initialize services
-        self.task_service = TaskService()
-        self.langgraph_agent = LangGraphTaskAgent(self.task_service)
-        self.foundry_agent = FoundryTaskAgent(self.task_service)
-        
         self._setup_middleware()
         self._setup_routes()
     
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        """Initialize services once the event loop is running and clean them up on shutdown."""
+        # One credential is shared by both agents so they reuse its token cache
+        self.credential = DefaultAzureCredential()
+        # Connection pools owned by the app and reused for every call to Azure,
+        # so TLS connections stay open between requests
+        self.http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=75)
+        )
+        self.http_session = requests.Session()
+        self.http_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=100))
+        transport = RequestsTransport(session=self.http_session, session_owner=False)
+        
+        self.task_service = await TaskService.create()
+        # Agent setup makes no network calls; the Foundry thread is created on first use
+        self.langgraph_agent = LangGraphTaskAgent(self.task_service, self.credential, self.http_async_client)
+        self.foundry_agent = FoundryTaskAgent(self.task_service, self.credential, transport)
+        
+        # Routes look the services up on the application state
+        app.state.task_service = self.task_service
+        app.state.langgraph_agent = self.langgraph_agent
+        app.state.foundry_agent = self.foundry_agent
+        try:
+            yield
+        finally:
+            await self.shutdown()
+    
     def _setup_middleware(self):
         """Set up CORS and other middleware."""
         self.app.add_middleware(
@@ -54,11 +91,7 @@ class TaskManagerApp:
     def _setup_routes(self):
         """Set up API routes and static file serving."""
         # API routes
-        api_router = create_api_routes(
-            self.task_service,
-            self.langgraph_agent,
-            self.foundry_agent
-        )
+        api_router = create_api_routes()
         self.app.include_router(api_router, prefix="/api")
         
         # Static files
@@ -81,9 +114,12 @@ class TaskManagerApp:
     
     async def shutdown(self):
         """Cleanup resources."""
-        print("Shutting down Task Manager app...")
-        self.task_service.close()
+        logger.info("Shutting down Task Manager app...")
+        await self.task_service.close()
         await self.foundry_agent.cleanup()
+        await self.http_async_client.aclose()
+        self.http_session.close()
+        self.credential.close()
 
 
 # Create the application instance
@@ -1,21 +1,38 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import logging
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import List, Optional
 from ..models import TaskItem, TaskCreateRequest, TaskUpdateRequest, ChatRequest, ChatMessage
 from ..services import TaskService
 from ..agents import LangGraphTaskAgent, FoundryTaskAgent
 
+logger = logging.getLogger(__name__)
 
-def create_api_routes(
-    task_service: TaskService,
-    langgraph_agent: LangGraphTaskAgent,
-    foundry_agent: FoundryTaskAgent
-) -> APIRouter:
+
+def get_task_service(request: Request) -> TaskService:
+    """Get the task service created during application startup."""
+    return request.app.state.task_service
+
+
+def get_langgraph_agent(request: Request) -> LangGraphTaskAgent:
+    """Get the LangGraph agent created during application startup."""
+    return request.app.state.langgraph_agent
+
+
+def get_foundry_agent(request: Request) -> FoundryTaskAgent:
+    """Get the Foundry agent created during application startup."""
+    return request.app.state.foundry_agent
+
+
+def create_api_routes() -> APIRouter:
     """
     Create API router with task CRUD endpoints and chat agent routes.
+    Services are resolved per request from the application state.
     
     Routes:
     - GET    /tasks          : Retrieves all tasks
     - POST   /tasks          : Creates a new task
+    - POST   /tasks:batch    : Creates several tasks at once
     - GET    /tasks/{id}     : Retrieves a task by its ID
     - PUT    /tasks/{id}     : Updates a task by its ID
     - DELETE /tasks/{id}     : Deletes a task by its ID
@@ -24,21 +41,28 @@ def create_api_routes(
     """
     router = APIRouter()
     
+    # The task service returns the same list object while its read cache is valid,
+    # so the serialized body is reused until the list changes
+    last_tasks: Optional[List[TaskItem]] = None
+    last_tasks_body = b""
+    
     @router.get(
         "/tasks",
         response_model=List[TaskItem],
         operation_id="getAllTasks",
         description="Retrieve all tasks in the task list."
     )
-    async def get_all_tasks():
+    async def get_all_tasks(task_service: TaskService = Depends(get_task_service)):
         """Get all tasks"""
+        nonlocal last_tasks, last_tasks_body
         try:
             tasks = await task_service.get_all_tasks()
-            return tasks
+            if tasks is not last_tasks:
+                last_tasks_body = orjson.dumps([task.model_dump() for task in tasks])
+                last_tasks = tasks
+            return Response(content=last_tasks_body, media_type="application/json")
         except Exception as e:
-            print(f"Error getting tasks: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error getting tasks")
             raise HTTPException(status_code=500, detail=f"Failed to get tasks: {str(e)}")
     
     @router.post(
@@ -48,7 +72,7 @@ def create_api_routes(
         operation_id="createTask",
         description="Create a new task with a title and completion status."
     )
-    async def create_task(task_request: TaskCreateRequest):
+    async def create_task(task_request: TaskCreateRequest, task_service: TaskService = Depends(get_task_service)):
         """Create a new task"""
         try:
             if not task_request.title:
@@ -62,18 +86,43 @@ def create_api_routes(
         except HTTPException:
             raise
         except Exception as e:
-            print(f"Error creating task: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error creating task")
             raise HTTPException(status_code=500, detail=f"Failed to create task: {str(e)}")
     
+    @router.post(
+        "/tasks:batch",
+        response_model=List[TaskItem],
+        status_code=201,
+        operation_id="createTasks",
+        description="Create several tasks in a single transaction."
+    )
+    async def create_tasks(
+        task_requests: List[TaskCreateRequest],
+        task_service: TaskService = Depends(get_task_service)
+    ):
+        """Create several tasks"""
+        try:
+            if any(not task_request.title for task_request in task_requests):
+                raise HTTPException(status_code=400, detail="Title is required")
+            
+            tasks = await task_service.add_tasks([
+                (task_request.title, task_request.isComplete or False)
+                for task_request in task_requests
+            ])
+            return tasks
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("Error creating tasks")
+            raise HTTPException(status_code=500, detail=f"Failed to create tasks: {str(e)}")
+    
     @router.get(
         "/tasks/{task_id}",
         response_model=TaskItem,
         operation_id="getTaskById",
         description="Retrieve a task by its unique ID."
     )
-    async def get_task_by_id(task_id: int):
+    async def get_task_by_id(task_id: int, task_service: TaskService = Depends(get_task_service)):
         """Get a task by its ID"""
         try:
             task = await task_service.get_task_by_id(task_id)
@@ -91,18 +140,20 @@ def create_api_routes(
         operation_id="updateTask",
         description="Update a task's title or completion status by its ID."
     )
-    async def update_task(task_id: int, task_request: TaskUpdateRequest):
+    async def update_task(task_id: int, task_request: TaskUpdateRequest, task_service: TaskService = Depends(get_task_service)):
         """Update a task by its ID"""
         try:
-            updated = await task_service.update_task(
-                task_id, 
-                task_request.title, 
-                task_request.isComplete
-            )
-            if not updated:
+            if task_request.title is None and task_request.isComplete is None:
+                # Nothing to change, so read the task (usually from cache) instead of writing
+                task = await task_service.get_task_by_id(task_id)
+            else:
+                task = await task_service.update_task(
+                    task_id, 
+                    task_request.title, 
+                    task_request.isComplete
+                )
+            if not task:
                 raise HTTPException(status_code=404, detail="Task not found")
-            
-            task = await task_service.get_task_by_id(task_id)
             return task
         except HTTPException:
             raise
@@ -114,7 +165,7 @@ def create_api_routes(
         operation_id="deleteTask",
         description="Delete a task by its unique ID."
     )
-    async def delete_task(task_id: int):
+    async def delete_task(task_id: int, task_service: TaskService = Depends(get_task_service)):
         """Delete a task by its ID"""
         try:
             deleted = await task_service.delete_task(task_id)
@@ -127,7 +178,10 @@ def create_api_routes(
             raise HTTPException(status_code=500, detail="Failed to delete task")
     
     @router.post("/chat/langgraph", response_model=ChatMessage, operation_id="chatWithLangGraph", include_in_schema=False)
-    async def chat_with_langgraph(chat_request: ChatRequest):
+    async def chat_with_langgraph(
+        chat_request: ChatRequest,
+        langgraph_agent: LangGraphTaskAgent = Depends(get_langgraph_agent)
+    ):
         """Process a chat message using the LangGraph agent"""
         try:
             if not chat_request.message:
@@ -140,12 +194,15 @@ def create_api_routes(
             return response
         except HTTPException:
             raise
-        except Exception as e:
-            print(f"Error in LangGraph chat: {e}")
+        except Exception:
+            logger.exception("Error in LangGraph chat")
             raise HTTPException(status_code=500, detail="Failed to process message")
     
     @router.post("/chat/foundry", response_model=ChatMessage, operation_id="chatWithFoundry", include_in_schema=False)
-    async def chat_with_foundry(chat_request: ChatRequest):
+    async def chat_with_foundry(
+        chat_request: ChatRequest,
+        foundry_agent: FoundryTaskAgent = Depends(get_foundry_agent)
+    ):
         """Process a chat message using the Foundry agent"""
         try:
             if not chat_request.message:
@@ -155,8 +212,8 @@ def create_api_routes(
             return response
         except HTTPException:
             raise
-        except Exception as e:
-            print(f"Error in Foundry chat: {e}")
+        except Exception:
+            logger.exception("Error in Foundry chat")
             raise HTTPException(status_code=500, detail="Failed to process message")
     
     return router
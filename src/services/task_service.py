@@ -1,148 +1,300 @@
-import sqlite3
 import asyncio
-from typing import List, Optional
-from concurrent.futures import ThreadPoolExecutor
+import logging
+import aiosqlite
+from typing import Dict, List, Optional, Tuple
 from ..models import TaskItem
 
+logger = logging.getLogger(__name__)
+
+# COALESCE keeps the existing value for any field passed as None
+UPDATE_TASK_SQL = (
+    "UPDATE tasks SET title = COALESCE(?, title), isComplete = COALESCE(?, isComplete) "
+    "WHERE id = ? RETURNING id, title, isComplete"
+)
+
 
 class TaskService:
     """
     Service class for managing tasks with CRUD operations.
     This service provides all the necessary operations for task management.
     """
-    
+
     def __init__(self):
         self.db_path = "tasks.db"  # Persistent file-based database
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        self._initialize_database()
-    
-    def _initialize_database(self):
+        self._conn: Optional[aiosqlite.Connection] = None
+        # A single SQLite connection is shared by all requests, so access is serialized
+        self._lock = asyncio.Lock()
+        # Reads are served from memory until the tasks change. Writes made through
+        # this service invalidate the cache directly; commits from other worker
+        # processes sharing the database file are detected through data_version.
+        self._list_cache: Optional[List[TaskItem]] = None
+        self._by_id_cache: Dict[int, TaskItem] = {}
+        self._data_version: Optional[int] = None
+        # Incremented whenever the cache is invalidated so callers can tell when
+        # cached results derived from task data are out of date
+        self.version = 0
+
+    @classmethod
+    async def create(cls) -> "TaskService":
+        """Create the service with its database connection already open."""
+        service = cls()
+        await service.connect()
+        return service
+
+    async def connect(self):
+        """Open the shared connection ahead of the first request."""
+        async with self._lock:
+            await self._get_connection()
+
+    async def _get_connection(self) -> aiosqlite.Connection:
+        """Return the shared connection, opening and initializing it on first use."""
+        if self._conn is None:
+            # A larger statement cache keeps every query this service issues prepared
+            conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+            await self._initialize_database(conn)
+            self._conn = conn
+        return self._conn
+
+    async def _initialize_database(self, conn: aiosqlite.Connection):
         """Initialize the SQLite database with tasks table."""
-        def init_db():
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    isComplete BOOLEAN DEFAULT 0
-                )
-            """)
-            conn.commit()
-            conn.close()
-            print("Tasks table initialized")
-        
-        # Run in thread pool to avoid blocking
-        self.executor.submit(init_db).result()
-    
+        # WAL lets readers proceed while a write is in progress and avoids an fsync
+        # of the rollback journal on every commit. journal_mode persists in the
+        # database file; the remaining pragmas apply to this connection only.
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        await conn.execute("PRAGMA mmap_size=268435456")
+        await conn.execute("PRAGMA cache_size=-20000")
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                isComplete BOOLEAN DEFAULT 0
+            )
+        """)
+        await conn.commit()
+        logger.info("Tasks table initialized")
+
+    def _invalidate_cache(self, task_id: Optional[int] = None):
+        """Drop the cached task list and, if given, the cached entry for one task."""
+        self.version += 1
+        self._list_cache = None
+        if task_id is not None:
+            self._by_id_cache.pop(task_id, None)
+
+    async def _check_data_version(self, conn: aiosqlite.Connection):
+        """Drop all cached reads if another connection has committed since they were loaded."""
+        # data_version only changes for commits made by other connections, which is
+        # why writes through this service still invalidate the cache themselves
+        async with conn.execute("PRAGMA data_version") as cursor:
+            (data_version,) = await cursor.fetchone()
+        if data_version != self._data_version:
+            if self._data_version is not None:
+                self._invalidate_cache()
+                self._by_id_cache.clear()
+            self._data_version = data_version
+
+    async def get_version(self) -> int:
+        """Return the current version, first checking for writes by other processes."""
+        async with self._lock:
+            await self._check_data_version(await self._get_connection())
+            return self.version
+
     async def get_all_tasks(self) -> List[TaskItem]:
         """Get all tasks from the database."""
-        def get_tasks():
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks ORDER BY id")
-            rows = cursor.fetchall()
-            conn.close()
-            
-            return [
-                TaskItem(
+        async with self._lock:
+            conn = await self._get_connection()
+            await self._check_data_version(conn)
+            if self._list_cache is not None:
+                return self._list_cache
+
+            async with conn.execute("SELECT id, title, isComplete FROM tasks ORDER BY id") as cursor:
+                rows = await cursor.fetchall()
+
+            # TaskItems are built with model_construct throughout this service: values come
+            # from the tasks table or from already validated request models, so running
+            # Pydantic validation again would only repeat the same type checks
+            tasks = [
+                TaskItem.model_construct(
                     id=row[0],
                     title=row[1],
                     isComplete=bool(row[2])
                 )
                 for row in rows
             ]
-        
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, get_tasks)
-    
+
+            # The cache is filled under the lock so a concurrent write cannot be
+            # overwritten by the results of an older read
+            self._list_cache = tasks
+            self._by_id_cache = {task.id: task for task in tasks}
+        return tasks
+
     async def get_task_by_id(self, task_id: int) -> Optional[TaskItem]:
         """Get a task by its ID."""
-        def get_task():
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-            row = cursor.fetchone()
-            conn.close()
-            
+        async with self._lock:
+            conn = await self._get_connection()
+            await self._check_data_version(conn)
+            cached = self._by_id_cache.get(task_id)
+            if cached is not None:
+                return cached
+
+            async with conn.execute("SELECT id, title, isComplete FROM tasks WHERE id = ?", (task_id,)) as cursor:
+                row = await cursor.fetchone()
+
             if row:
-                return TaskItem(
+                task = TaskItem.model_construct(
                     id=row[0],
                     title=row[1],
                     isComplete=bool(row[2])
                 )
-            return None
-        
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, get_task)
-    
+                self._by_id_cache[task_id] = task
+                return task
+        return None
+
+    async def get_tasks_by_ids(self, task_ids: List[int]) -> List[TaskItem]:
+        """Get the tasks with the given IDs in one query, in the order requested. Unknown IDs are skipped."""
+        found: Dict[int, TaskItem] = {}
+        async with self._lock:
+            conn = await self._get_connection()
+            await self._check_data_version(conn)
+            missing: List[int] = []
+            for task_id in dict.fromkeys(task_ids):
+                cached = self._by_id_cache.get(task_id)
+                if cached is not None:
+                    found[task_id] = cached
+                else:
+                    missing.append(task_id)
+
+            if missing:
+                placeholders = ", ".join("?" for _ in missing)
+                async with conn.execute(
+                    f"SELECT id, title, isComplete FROM tasks WHERE id IN ({placeholders})", missing
+                ) as cursor:
+                    rows = await cursor.fetchall()
+
+                for row in rows:
+                    task = TaskItem.model_construct(
+                        id=row[0],
+                        title=row[1],
+                        isComplete=bool(row[2])
+                    )
+                    found[task.id] = task
+                    self._by_id_cache[task.id] = task
+
+        return [found[task_id] for task_id in dict.fromkeys(task_ids) if task_id in found]
+
     async def add_task(self, title: str, is_complete: bool = False) -> TaskItem:
         """Add a new task to the database."""
-        def create_task():
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
+        async with self._lock:
+            conn = await self._get_connection()
+            async with conn.execute(
                 "INSERT INTO tasks (title, isComplete) VALUES (?, ?)",
                 (title, 1 if is_complete else 0)
+            ) as cursor:
+                task_id = cursor.lastrowid
+            await conn.commit()
+            self._invalidate_cache()
+
+        return TaskItem.model_construct(
+            id=task_id,
+            title=title,
+            isComplete=is_complete
+        )
+
+    async def add_tasks(self, tasks: List[Tuple[str, bool]]) -> List[TaskItem]:
+        """Add several (title, is_complete) tasks in a single transaction."""
+        if not tasks:
+            return []
+
+        created: List[TaskItem] = []
+        async with self._lock:
+            conn = await self._get_connection()
+            try:
+                for title, is_complete in tasks:
+                    async with conn.execute(
+                        "INSERT INTO tasks (title, isComplete) VALUES (?, ?) RETURNING id",
+                        (title, 1 if is_complete else 0)
+                    ) as cursor:
+                        row = await cursor.fetchone()
+                    created.append(TaskItem.model_construct(
+                        id=row[0],
+                        title=title,
+                        isComplete=is_complete
+                    ))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            finally:
+                self._invalidate_cache()
+
+        return created
+
+    async def update_task(self, task_id: int, title: Optional[str] = None, is_complete: Optional[bool] = None) -> Optional[TaskItem]:
+        """Update a task by its ID and return the updated task, or None if it does not exist."""
+        async with self._lock:
+            conn = await self._get_connection()
+            async with conn.execute(
+                UPDATE_TASK_SQL,
+                (title, None if is_complete is None else (1 if is_complete else 0), task_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+            await conn.commit()
+            self._invalidate_cache(task_id)
+
+        if row:
+            return TaskItem.model_construct(
+                id=row[0],
+                title=row[1],
+                isComplete=bool(row[2])
             )
-            task_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            return TaskItem(
-                id=task_id,
-                title=title,
-                isComplete=is_complete
-            )
-        
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, create_task)
-    
-    async def update_task(self, task_id: int, title: Optional[str] = None, is_complete: Optional[bool] = None) -> bool:
-        """Update a task by its ID."""
-        def update():
-            # First get current task to preserve existing values
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT title, isComplete FROM tasks WHERE id = ?", (task_id,))
-            row = cursor.fetchone()
-            
-            if not row:
-                conn.close()
-                return False
-            
-            current_title, current_complete = row
-            updated_title = title if title is not None else current_title
-            updated_complete = is_complete if is_complete is not None else bool(current_complete)
-            
-            cursor.execute(
-                "UPDATE tasks SET title = ?, isComplete = ? WHERE id = ?",
-                (updated_title, 1 if updated_complete else 0, task_id)
-            )
-            changes = cursor.rowcount
-            conn.commit()
-            conn.close()
-            
-            return changes > 0
-        
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, update)
-    
+        return None
+
+    async def update_tasks(self, updates: List[Tuple[int, Optional[str], Optional[bool]]]) -> List[TaskItem]:
+        """
+        Apply several (task_id, title, is_complete) updates in a single transaction.
+        Returns the updated tasks; IDs that do not exist are skipped.
+        """
+        tasks: List[TaskItem] = []
+        async with self._lock:
+            conn = await self._get_connection()
+            try:
+                for task_id, title, is_complete in updates:
+                    async with conn.execute(
+                        UPDATE_TASK_SQL,
+                        (title, None if is_complete is None else (1 if is_complete else 0), task_id)
+                    ) as cursor:
+                        row = await cursor.fetchone()
+                    if row:
+                        tasks.append(TaskItem.model_construct(
+                            id=row[0],
+                            title=row[1],
+                            isComplete=bool(row[2])
+                        ))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            finally:
+                for task_id, _, _ in updates:
+                    self._invalidate_cache(task_id)
+
+        return tasks
+
     async def delete_task(self, task_id: int) -> bool:
         """Delete a task by its ID."""
-        def delete():
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-            changes = cursor.rowcount
-            conn.commit()
-            conn.close()
-            
-            return changes > 0
-        
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, delete)
-    
-    def close(self):
-        """Close the database connection and thread pool."""
-        self.executor.shutdown(wait=True)
+        async with self._lock:
+            conn = await self._get_connection()
+            async with conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)) as cursor:
+                changes = cursor.rowcount
+            await conn.commit()
+            self._invalidate_cache(task_id)
+
+        return changes > 0
+
+    async def close(self):
+        """Close the database connection."""
+        async with self._lock:
+            if self._conn is not None:
+                await self._conn.close()
+                self._conn = None